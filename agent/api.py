@@ -6,9 +6,11 @@ This provides HTTP endpoints to interact with the agent from external applicatio
 
 import os
 import sys
+import orjson
 from typing import Optional
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
@@ -20,24 +22,29 @@ load_dotenv()
 app = FastAPI(
     title="Finance RAG Agent API",
     description="REST API for answering financial questions using RAG",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# CORS is only needed for browser clients; server-to-server deployments skip the middleware
+if os.getenv("ENABLE_CORS"):
+    cors_origins = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()]
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=cors_origins,
+        # Credentials cannot be combined with a wildcard origin
+        allow_credentials="*" not in cors_origins,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
 agent = None
 
 
 class QuestionRequest(BaseModel):
     question: str = Field(..., description="The financial question to ask")
-    retrieval_size: Optional[int] = Field(None, description="Number of articles to retrieve")
-    min_score: Optional[float] = Field(None, description="Minimum relevance score")
+    retrieval_size: Optional[int] = Field(None, ge=1, le=100, description="Number of articles to retrieve")
+    min_score: Optional[float] = Field(None, ge=0, description="Minimum relevance score")
 
 
 class QuestionResponse(BaseModel):
@@ -51,6 +58,7 @@ class QuestionResponse(BaseModel):
 class HealthResponse(BaseModel):
     status: str
     elasticsearch_connected: bool
+    ollama_connected: bool
     agent_initialized: bool
 
 
@@ -60,12 +68,20 @@ async def startup_event():
     global agent
     try:
         agent = FinanceRAGAgent()
+        await agent.check_ollama()
         print("✓ Agent initialized successfully")
     except Exception as e:
         print(f"✗ Failed to initialize agent: {e}")
         raise
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the agent's HTTP and Elasticsearch connections."""
+    if agent is not None:
+        await agent.aclose()
+
+
 @app.get("/", response_model=dict)
 async def root():
     """Root endpoint with API information."""
@@ -74,6 +90,7 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "POST /ask": "Ask a financial question",
+            "POST /ask/stream": "Ask a financial question, streaming the answer as server-sent events",
             "GET /health": "Check API health status",
             "GET /config": "Get current configuration",
             "GET /docs": "Interactive API documentation"
@@ -87,20 +104,20 @@ async def health_check():
     if agent is None:
         raise HTTPException(status_code=503, detail="Agent not initialized")
     
-    es_connected = False
-    try:
-        es_connected = agent.indexer.es.ping()
-    except Exception:
-        pass
+    es_connected = await agent.ping()
+    ollama_connected = await agent.ollama_available()
     
     return HealthResponse(
-        status="healthy" if es_connected else "degraded",
+        status="healthy" if es_connected and ollama_connected else "degraded",
         elasticsearch_connected=es_connected,
+        ollama_connected=ollama_connected,
         agent_initialized=agent is not None
     )
 
 
-@app.post("/ask", response_model=QuestionResponse)
+# No response_model: the agent builds the result itself, so output validation is skipped.
+# QuestionResponse is still published as the documented 200 schema.
+@app.post("/ask", response_class=ORJSONResponse, responses={200: {"model": QuestionResponse}})
 async def ask_question(request: QuestionRequest):
     """
     Ask a financial question and get an answer based on indexed articles.
@@ -114,22 +131,51 @@ async def ask_question(request: QuestionRequest):
         raise HTTPException(status_code=503, detail="Agent not initialized")
     
     try:
-        # Create temporary agent with custom params if provided
-        if request.retrieval_size or request.min_score:
-            temp_agent = FinanceRAGAgent(
-                retrieval_size=request.retrieval_size,
-                min_score=request.min_score
-            )
-            result = temp_agent.ask(request.question)
-        else:
-            result = agent.ask(request.question)
+        cached = agent.is_cached(
+            request.question,
+            retrieval_size=request.retrieval_size,
+            min_score=request.min_score
+        )
+        result = await agent.ask(
+            request.question,
+            retrieval_size=request.retrieval_size,
+            min_score=request.min_score
+        )
         
-        return QuestionResponse(**result)
+        return ORJSONResponse(result, headers={"X-Cache": "HIT" if cached else "MISS"})
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
 
 
+@app.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """
+    Ask a financial question and stream the answer as it is generated.
+    
+    Each server-sent event carries a JSON object: `{"response": "<text>"}` for
+    answer chunks, then `{"done": true}` once the answer is complete. If
+    generation fails, the stream ends with `{"error": "<message>"}` instead.
+    """
+    if agent is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+    
+    async def events():
+        try:
+            async for chunk in agent.stream_answer(
+                request.question,
+                retrieval_size=request.retrieval_size,
+                min_score=request.min_score
+            ):
+                yield b"data: " + orjson.dumps({"response": chunk}) + b"\n\n"
+        except Exception as e:
+            yield b"data: " + orjson.dumps({"error": f"Error generating answer: {e}"}) + b"\n\n"
+            return
+        yield b"data: " + orjson.dumps({"done": True}) + b"\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @app.get("/config", response_model=dict)
 async def get_config():
     """Get current agent configuration."""
@@ -151,4 +197,14 @@ async def get_config():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    
+    # Each worker process runs its own event loop and agent instance
+    workers = int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 2) * 2 + 1))
+    uvicorn.run(
+        "agent.api:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=workers,
+        loop="uvloop",
+        http="httptools"
+    )
@@ -1,10 +1,18 @@
 """Configuration loader for the Finance RAG Agent."""
 
 import os
+import copy
 import yaml
+from functools import cached_property, lru_cache
 from typing import Dict, Any
 from pathlib import Path
 
+try:
+    # libyaml-backed loader, much faster than the pure-Python one
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 
 class AgentConfig:
     """Configuration manager for the RAG agent."""
@@ -17,16 +25,26 @@ class AgentConfig:
         "llm": {
             "model": "mistralai/Mistral-7B-Instruct-v0.3",
             "temperature": 0.1,
-            "max_new_tokens": 512
+            "max_new_tokens": 512,
+            "keep_alive": "10m",
+            "max_context_tokens": 2000,
+            "batch_max_size": 8,
+            "batch_max_wait": 0.02
         },
         "retrieval": {
             "size": 5,
-            "min_score": 0.5,
-            "text_weight": 0.5
+            "min_score": 0.3,
+            "text_weight": 0.5,
+            "batch_max_size": 16,
+            "batch_max_wait": 0.005
         },
         "agent": {
             "verbose": False,
             "timeout": 30
+        },
+        "cache": {
+            "maxsize": 512,
+            "ttl": 900
         }
     }
     
@@ -37,59 +55,73 @@ class AgentConfig:
         Args:
             config_path: Path to YAML config file. If None, uses default config.yaml
                         in the agent directory.
-        """
-        self.config = self.DEFAULT_CONFIG.copy()
         
+        The parsed configuration is cached per path for the lifetime of the
+        process, so it must be treated as read-only.
+        """
         if config_path is None:
             # Default to config.yaml in agent directory
             agent_dir = Path(__file__).parent.parent
             config_path = agent_dir / "config.yaml"
         
+        # Resolve so equivalent paths share one cache entry
+        self.config = self._load(str(Path(config_path).resolve()))
+    
+    @classmethod
+    @lru_cache(maxsize=8)
+    def _load(cls, config_path: str) -> Dict:
+        """Build the configuration: defaults, then YAML file, then environment."""
+        config = copy.deepcopy(cls.DEFAULT_CONFIG)
+        
         if os.path.exists(config_path):
-            self._load_from_file(config_path)
+            cls._load_from_file(config, config_path)
         
         # Override with environment variables if set
-        self._load_from_env()
+        cls._load_from_env(config)
+        return config
     
-    def _load_from_file(self, config_path: str):
+    @classmethod
+    def _load_from_file(cls, config: Dict, config_path: str):
         """Load configuration from YAML file."""
         try:
             with open(config_path, 'r') as f:
-                file_config = yaml.safe_load(f)
+                file_config = yaml.load(f, Loader=SafeLoader)
                 if file_config:
-                    self._merge_config(self.config, file_config)
+                    cls._merge_config(config, file_config)
         except Exception as e:
             print(f"Warning: Could not load config from {config_path}: {e}")
     
-    def _load_from_env(self):
+    @staticmethod
+    def _load_from_env(config: Dict):
         """Override config with environment variables."""
         # Elasticsearch
         if os.getenv("ELASTICSEARCH_HOST"):
-            self.config["elasticsearch"]["host"] = os.getenv("ELASTICSEARCH_HOST")
+            config["elasticsearch"]["host"] = os.getenv("ELASTICSEARCH_HOST")
         if os.getenv("ELASTICSEARCH_INDEX"):
-            self.config["elasticsearch"]["index_name"] = os.getenv("ELASTICSEARCH_INDEX")
+            config["elasticsearch"]["index_name"] = os.getenv("ELASTICSEARCH_INDEX")
         
         # LLM
         if os.getenv("LLM_MODEL"):
-            self.config["llm"]["model"] = os.getenv("LLM_MODEL")
+            config["llm"]["model"] = os.getenv("LLM_MODEL")
         if os.getenv("LLM_TEMPERATURE"):
-            self.config["llm"]["temperature"] = float(os.getenv("LLM_TEMPERATURE"))
+            config["llm"]["temperature"] = float(os.getenv("LLM_TEMPERATURE"))
         if os.getenv("LLM_MAX_TOKENS"):
-            self.config["llm"]["max_new_tokens"] = int(os.getenv("LLM_MAX_TOKENS"))
+            config["llm"]["max_new_tokens"] = int(os.getenv("LLM_MAX_TOKENS"))
         
         # Retrieval
         if os.getenv("RETRIEVAL_SIZE"):
-            self.config["retrieval"]["size"] = int(os.getenv("RETRIEVAL_SIZE"))
+            config["retrieval"]["size"] = int(os.getenv("RETRIEVAL_SIZE"))
         if os.getenv("RETRIEVAL_MIN_SCORE"):
-            self.config["retrieval"]["min_score"] = float(os.getenv("RETRIEVAL_MIN_SCORE"))
+            config["retrieval"]["min_score"] = float(os.getenv("RETRIEVAL_MIN_SCORE"))
         if os.getenv("RETRIEVAL_TEXT_WEIGHT"):
-            self.config["retrieval"]["text_weight"] = float(os.getenv("RETRIEVAL_TEXT_WEIGHT"))
+            config["retrieval"]["text_weight"] = float(os.getenv("RETRIEVAL_TEXT_WEIGHT"))
     
-    def _merge_config(self, base: Dict, override: Dict):
+    @classmethod
+    def _merge_config(cls, base: Dict, override: Dict):
         """Recursively merge override config into base config."""
         for key, value in override.items():
             if key in base and isinstance(base[key], dict) and isinstance(value, dict):
-                self._merge_config(base[key], value)
+                cls._merge_config(base[key], value)
             else:
                 base[key] = value
     
@@ -115,56 +147,96 @@ class AgentConfig:
         
         return value
     
-    @property
+    @cached_property
     def es_host(self) -> str:
         """Get Elasticsearch host."""
         return self.get("elasticsearch.host")
     
-    @property
+    @cached_property
     def es_index(self) -> str:
         """Get Elasticsearch index name."""
         return self.get("elasticsearch.index_name")
     
-    @property
+    @cached_property
     def llm_model(self) -> str:
         """Get LLM model name."""
         return self.get("llm.model")
     
-    @property
+    @cached_property
     def llm_temperature(self) -> float:
         """Get LLM temperature."""
         return self.get("llm.temperature")
     
-    @property
+    @cached_property
     def llm_max_tokens(self) -> int:
         """Get LLM max tokens."""
         return self.get("llm.max_new_tokens")
     
-    @property
+    @cached_property
+    def llm_keep_alive(self) -> str:
+        """Get how long Ollama keeps the model loaded between requests."""
+        return self.get("llm.keep_alive")
+    
+    @cached_property
+    def llm_max_context_tokens(self) -> int:
+        """Get approximate token budget for article context in the prompt."""
+        return self.get("llm.max_context_tokens")
+    
+    @cached_property
+    def llm_batch_max_size(self) -> int:
+        """Get maximum number of prompts per LLM batch."""
+        return self.get("llm.batch_max_size")
+    
+    @cached_property
+    def llm_batch_max_wait(self) -> float:
+        """Get maximum seconds to wait while collecting an LLM batch."""
+        return self.get("llm.batch_max_wait")
+    
+    @cached_property
     def retrieval_size(self) -> int:
         """Get retrieval size."""
         return self.get("retrieval.size")
     
-    @property
+    @cached_property
     def retrieval_min_score(self) -> float:
         """Get minimum retrieval score."""
         return self.get("retrieval.min_score")
     
-    @property
+    @cached_property
     def retrieval_text_weight(self) -> float:
         """Get retrieval text weight for hybrid search."""
         return self.get("retrieval.text_weight")
     
-    @property
+    @cached_property
+    def retrieval_batch_max_size(self) -> int:
+        """Get maximum number of searches per Elasticsearch _msearch batch."""
+        return self.get("retrieval.batch_max_size")
+    
+    @cached_property
+    def retrieval_batch_max_wait(self) -> float:
+        """Get maximum seconds to wait while collecting a search batch."""
+        return self.get("retrieval.batch_max_wait")
+    
+    @cached_property
     def verbose(self) -> bool:
         """Get verbose flag."""
         return self.get("agent.verbose", False)
     
-    @property
+    @cached_property
     def timeout(self) -> int:
         """Get timeout in seconds."""
         return self.get("agent.timeout", 30)
     
+    @cached_property
+    def cache_maxsize(self) -> int:
+        """Get maximum number of cached answers."""
+        return self.get("cache.maxsize", 512)
+    
+    @cached_property
+    def cache_ttl(self) -> int:
+        """Get answer cache time-to-live in seconds."""
+        return self.get("cache.ttl", 900)
+    
     def __repr__(self) -> str:
         """String representation of config."""
         return f"AgentConfig({self.config})"
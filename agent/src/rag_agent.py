@@ -1,14 +1,60 @@
 import os
 import sys
-from typing import TypedDict, Annotated, Sequence, Optional
+import json
+import time
+import asyncio
+from string import Template
+from typing import TypedDict, Annotated, AsyncIterator, Sequence, Optional
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-import requests
+from langchain_core.runnables import RunnableConfig
+from cachetools import TTLCache
+import httpx
 
 # Add parent directory to path to import from pipeline src
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 from src.elasticsearch_indexer import ElasticsearchIndexer
 from agent.src.config_loader import AgentConfig
+from agent.src.batching import MicroBatcher
+
+
+# Seconds to wait for Ollama when probing availability
+OLLAMA_PROBE_TIMEOUT = 2.0
+
+# Seconds a health check result is reused before probing again
+HEALTH_CACHE_TTL = 5.0
+
+# Rough characters-per-token ratio used to estimate prompt length
+CHARS_PER_TOKEN = 4
+
+# Article fields passed from search hits to the prompt and API response
+ARTICLE_FIELDS = ("title", "description", "content", "url", "source", "published_at")
+
+
+# Prompt templates, parsed once at import
+PROMPT_TEMPLATE = Template("""You are a financial analyst assistant. Answer the user's question based ONLY on the provided article excerpts.
+
+Question: $question
+
+Relevant Articles:
+$context
+
+Instructions:
+- Provide a clear, concise answer based on the articles above
+- Cite specific articles when making claims (e.g., "According to [Source Name]...")
+- If the articles don't fully answer the question, acknowledge what information is available
+- Be factual and avoid speculation
+
+Answer:""")
+
+ARTICLE_TEMPLATE = """
+Article {index} (Score: {score:.2f}):
+Source: {source}
+Title: {title}
+Published: {published_at}
+Content: {description} {content}...
+URL: {url}
+"""
 
 
 class AgentState(TypedDict):
@@ -18,6 +64,9 @@ class AgentState(TypedDict):
     retrieved_articles: list
     answer: str
     articles_found: bool
+    retrieval_size: int
+    min_score: float
+    failed: bool
 
 
 class FinanceRAGAgent:
@@ -48,36 +97,108 @@ class FinanceRAGAgent:
         self.llm_model = llm_model
         self.llm_temperature = self.config.llm_temperature
         self.llm_max_tokens = self.config.llm_max_tokens
-        self.ollama_url = "http://localhost:11434/api/generate"
+        self.ollama_url = "http://localhost:11434"
+        
+        # Pooled keep-alive client reused for every Ollama call
+        self._http = httpx.AsyncClient(
+            base_url=self.ollama_url,
+            timeout=httpx.Timeout(60.0),
+            limits=httpx.Limits(max_keepalive_connections=32)
+        )
+        self.llm_keep_alive = self.config.llm_keep_alive
+        self.max_context_tokens = self.config.llm_max_context_tokens
+        self._llm_batcher = MicroBatcher(
+            self._generate_batch,
+            max_batch=self.config.llm_batch_max_size,
+            max_wait=self.config.llm_batch_max_wait
+        )
+        self._search_batcher = MicroBatcher(
+            self._search_batch,
+            max_batch=self.config.retrieval_batch_max_size,
+            max_wait=self.config.retrieval_batch_max_wait
+        )
+        
+        self.text_weight = self.config.retrieval_text_weight
+        self.verbose = self.config.verbose
+        
+        # (monotonic timestamp, result) of the last health probes
+        self._last_ping = (0.0, False)
+        self._last_ollama_check = (0.0, False)
         
-        # Check if Ollama is running
+        # Answers to repeated questions, keyed by normalized question + retrieval params
+        self._answer_cache = TTLCache(maxsize=self.config.cache_maxsize, ttl=self.config.cache_ttl)
+        self.graph = self._GRAPH
+    
+    async def check_ollama(self) -> bool:
+        """Check if Ollama is running."""
         try:
-            response = requests.get("http://localhost:11434/api/tags")
+            response = await self._http.get("/api/tags", timeout=OLLAMA_PROBE_TIMEOUT)
             if response.status_code == 200:
-                print(f"✓ Ollama is running, using model: {llm_model}")
-            else:
-                print(f"⚠ Ollama may not be running properly")
+                print(f"✓ Ollama is running, using model: {self.llm_model}")
+                return True
+            print(f"⚠ Ollama may not be running properly")
+        except httpx.TimeoutException:
+            print(f"⚠ Ollama probe timed out after {OLLAMA_PROBE_TIMEOUT}s")
         except Exception as e:
-            print(f"⚠ Warning: Could not connect to Ollama at http://localhost:11434")
+            print(f"⚠ Warning: Could not connect to Ollama at {self.ollama_url}")
             print(f"  Make sure Ollama is installed and running: 'ollama serve'")
+        return False
+    
+    async def ollama_available(self) -> bool:
+        """Quietly check whether Ollama answers within the probe timeout (cached briefly)."""
+        now = time.monotonic()
+        if now - self._last_ollama_check[0] < HEALTH_CACHE_TTL:
+            return self._last_ollama_check[1]
         
-        self.text_weight = self.config.retrieval_text_weight
-        self.verbose = self.config.verbose
-        self.graph = self._build_graph()
+        try:
+            response = await self._http.get("/api/tags", timeout=OLLAMA_PROBE_TIMEOUT)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        
+        self._last_ollama_check = (now, ok)
+        return ok
     
-    def _build_graph(self) -> StateGraph:
-        """Build the LangGraph workflow."""
+    async def ping(self) -> bool:
+        """Check whether Elasticsearch is reachable (cached briefly)."""
+        now = time.monotonic()
+        if now - self._last_ping[0] < HEALTH_CACHE_TTL:
+            return self._last_ping[1]
+        
+        try:
+            ok = await self.indexer.aes.ping()
+        except Exception:
+            ok = False
+        
+        self._last_ping = (now, ok)
+        return ok
+    
+    async def aclose(self):
+        """Close the HTTP and Elasticsearch clients."""
+        await self._llm_batcher.aclose()
+        await self._search_batcher.aclose()
+        await self._http.aclose()
+        await self.indexer.aclose()
+    
+    @classmethod
+    def _build_graph(cls) -> StateGraph:
+        """
+        Build the LangGraph workflow.
+        
+        The graph is compiled once per process and shared by all agents; nodes
+        find the calling agent in `config["configurable"]["agent"]`.
+        """
         workflow = StateGraph(AgentState)
         
-        workflow.add_node("retrieve", self._retrieve_articles)
-        workflow.add_node("generate_answer", self._generate_answer)
-        workflow.add_node("no_articles_found", self._no_articles_found)
+        workflow.add_node("retrieve", cls._retrieve_node)
+        workflow.add_node("generate_answer", cls._generate_answer_node)
+        workflow.add_node("no_articles_found", cls._no_articles_found_node)
         
         workflow.set_entry_point("retrieve")
         
         workflow.add_conditional_edges(
             "retrieve",
-            self._check_articles_found,
+            cls._check_articles_found,
             {
                 "found": "generate_answer",
                 "not_found": "no_articles_found"
@@ -89,32 +210,32 @@ class FinanceRAGAgent:
         
         return workflow.compile()
     
-    def _retrieve_articles(self, state: AgentState) -> AgentState:
+    @staticmethod
+    async def _retrieve_node(state: AgentState, config: RunnableConfig) -> AgentState:
+        return await config["configurable"]["agent"]._retrieve_articles(state)
+    
+    @staticmethod
+    async def _generate_answer_node(state: AgentState, config: RunnableConfig) -> AgentState:
+        return await config["configurable"]["agent"]._generate_answer(state)
+    
+    @staticmethod
+    def _no_articles_found_node(state: AgentState, config: RunnableConfig) -> AgentState:
+        return config["configurable"]["agent"]._no_articles_found(state)
+    
+    async def _retrieve_articles(self, state: AgentState) -> AgentState:
         """Retrieve relevant articles from Elasticsearch using hybrid search."""
         question = state["question"]
         
         try:
-            results = self.indexer.hybrid_search(
-                index_name=self.index_name,
-                query=question,
-                size=self.retrieval_size,
-                text_weight=self.text_weight
+            results = await self._search_batcher.submit(
+                (question, state["retrieval_size"], self.text_weight, state["min_score"])
             )
-
-            articles = []
-            for hit in results.get("hits", {}).get("hits", []):
-                score = hit["_score"]
-                if score >= self.min_score:
-                    source = hit["_source"]
-                    articles.append({
-                        "title": source.get("title", ""),
-                        "description": source.get("description", ""),
-                        "content": source.get("content", ""),
-                        "url": source.get("url", ""),
-                        "source": source.get("source", ""),
-                        "published_at": source.get("published_at", ""),
-                        "score": score
-                    })
+            
+            # min_score is already applied by Elasticsearch
+            articles = [
+                {**{key: hit["_source"].get(key, "") for key in ARTICLE_FIELDS}, "score": hit["_score"]}
+                for hit in results.get("hits", {}).get("hits", [])
+            ]
             
             state["retrieved_articles"] = articles
             state["articles_found"] = len(articles) > 0
@@ -124,55 +245,29 @@ class FinanceRAGAgent:
                 print(f"Error retrieving articles: {e}")
             state["retrieved_articles"] = []
             state["articles_found"] = False
+            # Keep the "no articles" answer out of the cache; the search may succeed next time
+            state["failed"] = True
         
         return state
     
-    def _check_articles_found(self, state: AgentState) -> str:
+    async def _search_batch(self, queries: list) -> list:
+        """Run a batch of hybrid searches collected by the batcher as one _msearch."""
+        return await self.indexer.hybrid_msearch_async(
+            self.index_name, queries, source_includes=ARTICLE_FIELDS
+        )
+    
+    @staticmethod
+    def _check_articles_found(state: AgentState) -> str:
         """Check if any relevant articles were found."""
         return "found" if state["articles_found"] else "not_found"
     
-    def _generate_answer(self, state: AgentState) -> AgentState:
+    async def _generate_answer(self, state: AgentState) -> AgentState:
         """Generate answer using LLM based on retrieved articles."""
         question = state["question"]
-        articles = state["retrieved_articles"]
-        
-        context = self._format_context(articles)
-        
-        prompt = f"""You are a financial analyst assistant. Answer the user's question based ONLY on the provided article excerpts.
-
-Question: {question}
-
-Relevant Articles:
-{context}
-
-Instructions:
-- Provide a clear, concise answer based on the articles above
-- Cite specific articles when making claims (e.g., "According to [Source Name]...")
-- If the articles don't fully answer the question, acknowledge what information is available
-- Be factual and avoid speculation
-
-Answer:"""
+        prompt = self._build_prompt(question, state["retrieved_articles"])
         
         try:
-            # Use Ollama for local model inference
-            response = requests.post(
-                self.ollama_url,
-                json={
-                    "model": self.llm_model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": self.llm_temperature,
-                        "num_predict": self.llm_max_tokens
-                    }
-                },
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                answer = response.json().get('response', '')
-            else:
-                answer = f"Error: Ollama returned status {response.status_code}"
+            answer = await self._llm_batcher.submit(prompt)
             
             state["answer"] = answer
             state["messages"].append(HumanMessage(content=question))
@@ -183,14 +278,61 @@ Answer:"""
             if self.verbose:
                 print(error_msg)
             state["answer"] = error_msg
+            state["failed"] = True
         
         return state
     
+    def _build_prompt(self, question: str, articles: list) -> str:
+        """Build the LLM prompt from the question and retrieved articles."""
+        return PROMPT_TEMPLATE.substitute(question=question, context=self._format_context(articles))
+    
+    async def _generate_batch(self, prompts: list) -> list:
+        """Generate answers for a batch of prompts collected by the batcher."""
+        # Ollama has no batch endpoint; identical prompts share one call and the
+        # rest go out concurrently over the pooled client
+        unique = list(dict.fromkeys(prompts))
+        answers = await asyncio.gather(
+            *(self._ollama_generate(prompt) for prompt in unique),
+            return_exceptions=True
+        )
+        by_prompt = dict(zip(unique, answers))
+        return [by_prompt[prompt] for prompt in prompts]
+    
+    async def _ollama_generate(self, prompt: str) -> str:
+        """Run a single non-streaming Ollama generation."""
+        response = await self._http.post("/api/generate", json=self._ollama_payload(prompt, stream=False))
+        
+        if response.status_code != 200:
+            raise RuntimeError(f"Ollama returned status {response.status_code}")
+        return response.json().get('response', '')
+    
+    def _ollama_payload(self, prompt: str, stream: bool) -> dict:
+        """Build the request body for Ollama's /api/generate."""
+        return {
+            "model": self.llm_model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.llm_keep_alive,
+            "options": {
+                "temperature": self.llm_temperature,
+                "num_predict": self.llm_max_tokens
+            }
+        }
+    
     def _no_articles_found(self, state: AgentState) -> AgentState:
         """Handle case when no relevant articles are found."""
         question = state["question"]
+        answer = self._no_articles_message(question)
+        
+        state["answer"] = answer
+        state["messages"].append(HumanMessage(content=question))
+        state["messages"].append(AIMessage(content=answer))
         
-        answer = f"""I couldn't find any relevant articles in the database to answer your question: "{question}"
+        return state
+    
+    def _no_articles_message(self, question: str) -> str:
+        """Fallback answer when retrieval finds nothing."""
+        return f"""I couldn't find any relevant articles in the database to answer your question: "{question}"
 
 This could mean:
 - No articles matching your query have been indexed yet
@@ -201,50 +343,161 @@ You can run the pipeline to fetch and index more articles:
 ```
 uv run pipeline.py --company "YourCompany"
 ```"""
+    
+    def _format_context(self, articles: list) -> str:
+        """
+        Format retrieved articles into context string.
         
-        state["answer"] = answer
-        state["messages"].append(HumanMessage(content=question))
-        state["messages"].append(AIMessage(content=answer))
+        Articles are deduplicated by URL and added best-score first until the
+        context would exceed `llm.max_context_tokens` (estimated from length);
+        the top article is always included.
+        """
+        budget = self.max_context_tokens * CHARS_PER_TOKEN
+        seen_urls = set()
+        blocks = []
+        used = 0
         
-        return state
+        for article in sorted(articles, key=lambda a: a['score'], reverse=True):
+            url = article['url']
+            if url and url in seen_urls:
+                continue
+            seen_urls.add(url)
+            
+            block = self._format_article(len(blocks) + 1, article)
+            if blocks and used + len(block) > budget:
+                break
+            blocks.append(block)
+            used += len(block)
+        
+        return "\n".join(blocks)
     
-    def _format_context(self, articles: list) -> str:
-        """Format retrieved articles into context string."""
-        context_parts = []
-        
-        for i, article in enumerate(articles, 1):
-            context_parts.append(f"""
-Article {i} (Score: {article['score']:.2f}):
-Source: {article['source']}
-Title: {article['title']}
-Published: {article['published_at']}
-Content: {article['description']} {article['content'][:500]}...
-URL: {article['url']}
-""")
-        
-        return "\n".join(context_parts)
+    @staticmethod
+    def _format_article(index: int, article: dict) -> str:
+        """Format one article for the prompt context."""
+        description = article['description'] or ""
+        content = (article['content'] or "")[:500]
+        # NewsAPI content often starts with the description; don't send it twice
+        if description and content.startswith(description):
+            description = ""
+        return ARTICLE_TEMPLATE.format_map({**article, "index": index, "description": description, "content": content})
     
-    def ask(self, question: str) -> dict:
-        """Ask a question and get an answer based on indexed articles."""
-        initial_state = {
-            "messages": [],
-            "question": question,
-            "retrieved_articles": [],
-            "answer": "",
-            "articles_found": False
-        }
+    async def ask(
+        self,
+        question: str,
+        retrieval_size: Optional[int] = None,
+        min_score: Optional[float] = None
+    ) -> dict:
+        """
+        Ask a question and get an answer based on indexed articles.
         
-        final_state = self.graph.invoke(initial_state)
+        Args:
+            question: The question to answer
+            retrieval_size: Per-call override of the number of articles to retrieve
+            min_score: Per-call override of the minimum relevance score
+        """
+        initial_state = self._initial_state(question, retrieval_size, min_score)
+        key = self._cache_key(question, initial_state["retrieval_size"], initial_state["min_score"])
         
-        return {
+        cached = self._answer_cache.get(key)
+        if cached is not None:
+            # The key is normalized, so echo this caller's wording, not the first asker's
+            return {**cached, "question": question}
+        
+        final_state = await self.graph.ainvoke(initial_state, config={"configurable": {"agent": self}})
+        
+        result = {
             "question": question,
             "answer": final_state["answer"],
             "articles_found": final_state["articles_found"],
             "num_articles": len(final_state["retrieved_articles"]),
             "articles": final_state["retrieved_articles"]
         }
+        
+        if not final_state["failed"]:
+            self._answer_cache[key] = result
+        return result
+    
+    def is_cached(
+        self,
+        question: str,
+        retrieval_size: Optional[int] = None,
+        min_score: Optional[float] = None
+    ) -> bool:
+        """Check whether `ask` would answer from the cache."""
+        state = self._initial_state(question, retrieval_size, min_score)
+        return self._cache_key(question, state["retrieval_size"], state["min_score"]) in self._answer_cache
     
-    def chat(self):
+    def _cache_key(self, question: str, retrieval_size: int, min_score: float) -> tuple:
+        """Build the answer cache key for a question and its retrieval params."""
+        return (" ".join(question.lower().split()), retrieval_size, min_score, self.text_weight)
+    
+    async def stream_answer(
+        self,
+        question: str,
+        retrieval_size: Optional[int] = None,
+        min_score: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        Answer a question, yielding the LLM output in chunks as Ollama generates it.
+        
+        Takes the same arguments as `ask`. Streams bypass the LLM batcher since
+        each response is consumed incrementally. Generation failures (a non-200
+        from Ollama, an `error` line in its stream, or a connection error) are
+        raised rather than yielded, so callers can tell them from answer text;
+        so is a failed article search.
+        """
+        state = await self._retrieve_articles(self._initial_state(question, retrieval_size, min_score))
+        
+        if state["failed"]:
+            raise RuntimeError("Article retrieval failed")
+        if not state["articles_found"]:
+            yield self._no_articles_message(question)
+            return
+        
+        prompt = self._build_prompt(question, state["retrieved_articles"])
+        
+        try:
+            async with self._http.stream(
+                "POST", "/api/generate", json=self._ollama_payload(prompt, stream=True)
+            ) as response:
+                if response.status_code != 200:
+                    raise RuntimeError(f"Ollama returned status {response.status_code}")
+                
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise RuntimeError(f"Ollama error: {chunk['error']}")
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        break
+        
+        except Exception as e:
+            if self.verbose:
+                print(f"Error generating answer: {e}")
+            raise
+    
+    def _initial_state(
+        self,
+        question: str,
+        retrieval_size: Optional[int],
+        min_score: Optional[float]
+    ) -> AgentState:
+        """Build the graph input state, applying per-call retrieval overrides."""
+        return {
+            "messages": [],
+            "question": question,
+            "retrieved_articles": [],
+            "answer": "",
+            "articles_found": False,
+            "retrieval_size": retrieval_size if retrieval_size is not None else self.retrieval_size,
+            "min_score": min_score if min_score is not None else self.min_score,
+            "failed": False
+        }
+    
+    async def chat(self):
         """Interactive chat loop."""
         print("Finance RAG Agent - Ask questions about indexed financial articles")
         print("Type 'quit' or 'exit' to stop\n")
@@ -260,9 +513,12 @@ URL: {article['url']}
                 continue
             
             print("\nThinking...\n")
-            result = self.ask(question)
+            result = await self.ask(question)
             
             print(f"Agent: {result['answer']}\n")
             
             if result["articles_found"]:
                 print(f"(Based on {result['num_articles']} articles)\n")
+
+
+FinanceRAGAgent._GRAPH = FinanceRAGAgent._build_graph()
@@ -6,11 +6,12 @@ financial questions using articles indexed in Elasticsearch.
 """
 
 import os
+import asyncio
 from dotenv import load_dotenv
 from agent.src.rag_agent import FinanceRAGAgent
 
 
-def main():
+async def main():
     load_dotenv()
     
     # Initialize the agent with local model
@@ -19,10 +20,11 @@ def main():
         index_name="finance_articles"
         # Uses config.yaml settings by default (google/flan-t5-base)
     )
+    await agent.check_ollama()
     
     # Example 1: Single question
     print("=== Example 1: Single Question ===\n")
-    result = agent.ask("What are the latest developments with Tesla's Cybertruck?")
+    result = await agent.ask("What are the latest developments with Tesla's Cybertruck?")
     print(f"Q: {result['question']}")
     print(f"A: {result['answer']}\n")
     
@@ -34,15 +36,18 @@ def main():
     
     # Example 2: Question with no results
     print("=== Example 2: Question Outside Index ===\n")
-    result = agent.ask("What is the price of Bitcoin today?")
+    result = await agent.ask("What is the price of Bitcoin today?")
     print(f"Q: {result['question']}")
     print(f"A: {result['answer']}\n")
     print("="*60 + "\n")
     
     # Example 3: Interactive chat mode
     print("=== Example 3: Interactive Chat ===\n")
-    agent.chat()
+    try:
+        await agent.chat()
+    finally:
+        await agent.aclose()
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,5 +1,6 @@
 import os
 import argparse
+from itertools import chain
 from dotenv import load_dotenv
 from src.article_fetcher import ArticleFetcher
 from src.text_processor import TextProcessor
@@ -15,6 +16,8 @@ def main():
     parser.add_argument('--skip-fetch', action='store_true', help='Skip fetching and use existing JSON file')
     parser.add_argument('--skip-index', action='store_true', help='Skip Elasticsearch indexing')
     parser.add_argument('--index-name', type=str, default='finance_articles', help='Elasticsearch index name')
+    parser.add_argument('--batch-size', type=int, default=16, help='Batch size for NER and embedding inference')
+    parser.add_argument('--fast-bulk', action='store_true', help='Index by sending pre-serialized NDJSON bulk bodies')
     
     args = parser.parse_args()
     
@@ -35,40 +38,42 @@ def main():
             return
         
         print(f"\n=== Step 2: Processing articles (NER + Embeddings) ===")
-        processor = TextProcessor()
-        processed_articles = []
-        
-        for i, article in enumerate(articles, 1):
-            print(f"Processing article {i}/{len(articles)}: {article['title'][:50]}...")
-            processed_article = processor.process_article(article)
-            processed_articles.append(processed_article)
+        processor = TextProcessor(cache_path=os.getenv('EMBEDDING_CACHE_PATH'))
+        print(f"Processing {len(articles)} articles in batches of {args.batch_size}...")
+        processed_articles = processor.process_articles(articles, batch_size=args.batch_size)
         
         print(f"\n=== Step 3: Saving to JSON file ===")
         JSONHandler.save_to_json(processed_articles, args.output)
     else:
         print(f"\n=== Loading articles from {args.output} ===")
-        processed_articles = JSONHandler.load_from_json(args.output)
+        # Stream the file into the indexer instead of loading it all into memory
+        articles_iter = JSONHandler.iter_from_json(args.output)
+        first_article = next(articles_iter, None)
         
-        if not processed_articles:
+        if first_article is None:
             print("No articles found in JSON file. Exiting.")
             return
+        processed_articles = chain([first_article], articles_iter)
     
     if not args.skip_index:
         print(f"\n=== Step 4: Indexing to Elasticsearch ===")
         es_host = os.getenv('ELASTICSEARCH_HOST', 'http://localhost:9200')
         
         indexer = ElasticsearchIndexer(host=es_host)
-        success, failed = indexer.index_articles(processed_articles, args.index_name)
+        if args.fast_bulk:
+            success, failed = indexer.fast_bulk_index(processed_articles, args.index_name)
+        else:
+            success, failed = indexer.index_articles(processed_articles, args.index_name)
         
         print(f"\n=== Pipeline Complete ===")
-        print(f"Total articles processed: {len(processed_articles)}")
+        print(f"Total articles processed: {success + len(failed)}")
         print(f"Successfully indexed: {success}")
         print(f"Failed to index: {len(failed) if failed else 0}")
         print(f"Elasticsearch index: {args.index_name}")
         print(f"Kibana dashboard: http://localhost:5601")
     else:
         print(f"\n=== Pipeline Complete (Indexing Skipped) ===")
-        print(f"Total articles processed: {len(processed_articles)}")
+        print(f"Total articles processed: {sum(1 for _ in processed_articles)}")
         print(f"Output file: {args.output}")
 
 
@@ -0,0 +1,19 @@
+from typing import Dict, List, Optional
+
+import msgspec
+
+
+class Article(msgspec.Struct, omit_defaults=True):
+    """A news article as it moves through fetching, processing, JSONL storage and indexing."""
+    # NewsAPI returns null for missing fields, so the raw text fields stay Optional
+    title: Optional[str] = ""
+    description: Optional[str] = ""
+    content: Optional[str] = ""
+    url: Optional[str] = ""
+    published_at: Optional[str] = ""
+    source: Optional[str] = ""
+    author: Optional[str] = ""
+    company: Optional[str] = ""
+    entities: List[Dict[str, str]] = []
+    embedding: List[float] = []
+    full_text: str = ""
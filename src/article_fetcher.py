@@ -1,45 +1,83 @@
-import os
-from newsapi import NewsApiClient
+import asyncio
+import aiohttp
+from itertools import chain, zip_longest
 from typing import List, Dict
 from datetime import datetime, timedelta
 
+from src.article import Article
+
+
+NEWSAPI_EVERYTHING_URL = "https://newsapi.org/v2/everything"
+
 
 class ArticleFetcher:
     def __init__(self, api_key: str):
-        self.newsapi = NewsApiClient(api_key=api_key)
-    
-    def fetch_articles(self, company_name: str, days_back: int = 1, language: str = 'en', limit: int = 50) -> List[Dict]:
-        from_date = (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d')
-        to_date = datetime.now().strftime('%Y-%m-%d')
-        
+        self.api_key = api_key
+
+    def fetch_articles(self, company_name: str, days_back: int = 1, language: str = 'en', limit: int = 50) -> List[Article]:
+        return asyncio.run(self.fetch_articles_async(company_name, days_back, language, limit))
+
+    async def fetch_articles_async(self, company_name: str, days_back: int = 1, language: str = 'en', limit: int = 50) -> List[Article]:
+        today = datetime.now().date()
+        days = [today - timedelta(days=offset) for offset in range(days_back + 1)]
+
         try:
-            all_articles = self.newsapi.get_everything(
-                q=company_name,
-                from_param=from_date,
-                to=to_date,
-                language=language,
-                sort_by='relevancy',
-                page_size=100
-            )
-            
-            articles = []
-            for article in all_articles.get('articles', []):
-                if limit and len(articles) >= limit:
-                    break
-                if article.get('content') or article.get('description'):
-                    articles.append({
-                        'title': article.get('title', ''),
-                        'description': article.get('description', ''),
-                        'content': article.get('content', ''),
-                        'url': article.get('url', ''),
-                        'published_at': article.get('publishedAt', ''),
-                        'source': article.get('source', {}).get('name', ''),
-                        'author': article.get('author', ''),
-                        'company': company_name
-                    })
-            
-            return articles
-        
+            # One request per day, fetched concurrently
+            async with aiohttp.ClientSession(headers={"X-Api-Key": self.api_key}) as session:
+                buckets = await asyncio.gather(
+                    *(self._fetch_day(session, company_name, day, language) for day in days)
+                )
+
         except Exception as e:
             print(f"Error fetching articles: {e}")
             return []
+
+        # Interleave the days so the limit doesn't favour a single day
+        raw_articles = (a for a in chain.from_iterable(zip_longest(*buckets)) if a is not None)
+
+        articles = []
+        seen_urls = set()
+        for article in raw_articles:
+            if limit and len(articles) >= limit:
+                break
+            url = article.get('url', '')
+            if url in seen_urls:
+                continue
+            seen_urls.add(url)
+            if article.get('content') or article.get('description'):
+                articles.append(Article(
+                    title=article.get('title', ''),
+                    description=article.get('description', ''),
+                    content=article.get('content', ''),
+                    url=url,
+                    published_at=article.get('publishedAt', ''),
+                    source=(article.get('source') or {}).get('name', ''),
+                    author=article.get('author', ''),
+                    company=company_name
+                ))
+
+        return articles
+
+    async def _fetch_day(self, session: aiohttp.ClientSession, company_name: str, day, language: str) -> List[Dict]:
+        params = {
+            'q': company_name,
+            'from': f"{day.isoformat()}T00:00:00",
+            'to': f"{day.isoformat()}T23:59:59",
+            'language': language,
+            'sortBy': 'relevancy',
+            'pageSize': 100
+        }
+
+        try:
+            async with session.get(NEWSAPI_EVERYTHING_URL, params=params) as response:
+                data = await response.json()
+
+            if data.get('status') != 'ok':
+                print(f"Error fetching articles for {day}: {data.get('message', data.get('code'))}")
+                return []
+
+            return data.get('articles', [])
+
+        except Exception as e:
+            print(f"Error fetching articles for {day}: {e}")
+            return []
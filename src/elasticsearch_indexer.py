@@ -1,24 +1,77 @@
-from elasticsearch import Elasticsearch, helpers
-from typing import List, Dict
+from elasticsearch import AsyncElasticsearch, Elasticsearch, helpers
+from elasticsearch import ApiError, ConnectionTimeout
+from elasticsearch import ConnectionError as ESConnectionError
+import msgspec
+import orjson
+from contextlib import contextmanager
+from typing import Iterable, List, Dict, Optional, Tuple, Union
+import asyncio
+import math
+import threading
 import time
 
+from src.article import Article
+from src.embedding_cache import LRUCache, cached_batch
+
 
 class ElasticsearchIndexer:
-    def __init__(self, host: str = "http://localhost:9200"):
-        self.es = Elasticsearch([host])
+    def __init__(self, host: str = "http://localhost:9200", embedding_cache: Optional[LRUCache] = None,
+                 bulk_chunk_size: int = 500, bulk_max_chunk_bytes: int = 10 * 1024 * 1024,
+                 number_of_shards: int = 1, number_of_replicas: int = 1, refresh_interval: str = "1s",
+                 bulk_refresh_interval: str = "30s", translog_durability: str = "async"):
+        self.bulk_chunk_size = bulk_chunk_size
+        self.bulk_max_chunk_bytes = bulk_max_chunk_bytes
+        # Serving settings, applied once a bulk load finishes
+        self.number_of_shards = number_of_shards
+        self.number_of_replicas = number_of_replicas
+        self.refresh_interval = refresh_interval
+        # Ingestion settings: fewer refreshes/segments and no per-request fsync
+        self.bulk_refresh_interval = bulk_refresh_interval
+        self.translog_durability = translog_durability
+        # One pooled client per flavour for the indexer's lifetime: gzip request bodies (news JSON
+        # compresses well), keep enough connections for parallel bulk, and retry transient errors
+        client_options = {
+            "http_compress": True,
+            "connections_per_node": 25,
+            "request_timeout": 60,
+            "retry_on_timeout": True,
+            "max_retries": 3
+        }
+        self.es = Elasticsearch([host], **client_options)
+        self.aes = AsyncElasticsearch([host], **client_options)
+        # Query vectors keyed by content hash; may be shared with a TextProcessor's cache
+        self.embedding_cache = embedding_cache if embedding_cache is not None else LRUCache(maxsize=1024)
+        self._query_model = None
+        self._query_model_lock = threading.Lock()
         self.wait_for_connection()
     
     def wait_for_connection(self, max_retries: int = 30, retry_delay: int = 2):
-        for i in range(max_retries):
+        timeout = max_retries * retry_delay
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        
+        while True:
+            remaining = max(1, int(deadline - time.monotonic()))
             try:
-                if self.es.ping():
-                    print("Successfully connected to Elasticsearch")
-                    return
-            except Exception as e:
-                print(f"Waiting for Elasticsearch connection... (attempt {i+1}/{max_retries})")
+                # Long-polls server-side until the cluster is at least yellow; returns at once if it already is
+                health = self.es.options(request_timeout=remaining + 5, ignore_status=408).cluster.health(
+                    wait_for_status="yellow",
+                    timeout=f"{remaining}s"
+                )
+                if health.get("timed_out"):
+                    raise ConnectionError(f"Elasticsearch cluster not ready after {timeout}s (status: {health.get('status')})")
+                print("Successfully connected to Elasticsearch")
+                return
+            except (ESConnectionError, ConnectionTimeout, ApiError) as e:
+                # The health call needs a reachable node with an elected master (503 until then),
+                # so keep retrying until the server is up; other API errors are real failures
+                if isinstance(e, ApiError) and e.status_code != 503:
+                    raise
+                attempt += 1
+                if attempt >= max_retries or time.monotonic() >= deadline:
+                    raise ConnectionError("Could not connect to Elasticsearch after maximum retries")
+                print(f"Waiting for Elasticsearch connection... (attempt {attempt}/{max_retries})")
                 time.sleep(retry_delay)
-        
-        raise ConnectionError("Could not connect to Elasticsearch after maximum retries")
     
     def create_index(self, index_name: str):
         if self.es.indices.exists(index=index_name):
@@ -26,6 +79,19 @@ class ElasticsearchIndexer:
             return
         
         index_mapping = {
+            # New indices start in bulk-load mode; bulk_load_context switches them to serving settings
+            "settings": {
+                "index": {
+                    "number_of_shards": self.number_of_shards,
+                    "number_of_replicas": 0,
+                    "refresh_interval": self.bulk_refresh_interval,
+                    "translog": {
+                        "durability": self.translog_durability,
+                        "sync_interval": "30s",
+                        "flush_threshold_size": "1gb"
+                    }
+                }
+            },
             "mappings": {
                 "properties": {
                     "title": {"type": "text"},
@@ -48,7 +114,8 @@ class ElasticsearchIndexer:
                         "type": "dense_vector",
                         "dims": 384,
                         "index": True,
-                        "similarity": "cosine"
+                        # Embeddings are L2-normalized, so dot product equals cosine without the norms
+                        "similarity": "dot_product"
                     }
                 }
             }
@@ -57,19 +124,163 @@ class ElasticsearchIndexer:
         self.es.indices.create(index=index_name, body=index_mapping)
         print(f"Created index '{index_name}'")
     
-    def index_articles(self, articles: List[Dict], index_name: str):
-        self.create_index(index_name)
+    @staticmethod
+    def _unit_embedding(article: Union[Article, Dict]) -> Dict:
+        """Return the article as a plain document with a unit-length embedding."""
+        # Structs become builtins only here, at the Elasticsearch boundary
+        if isinstance(article, msgspec.Struct):
+            article = msgspec.to_builtins(article)
         
-        actions = []
+        embedding = article.get("embedding")
+        if not embedding:
+            return article
+        
+        # TextProcessor already normalizes; only older files need rescaling for dot_product
+        magnitude = math.hypot(*embedding)
+        if magnitude == 0 or abs(magnitude - 1.0) <= 1e-4:
+            return article
+        return {**article, "embedding": [x / magnitude for x in embedding]}
+    
+    @classmethod
+    def _bulk_actions(cls, articles: Iterable[Union[Article, Dict]], index_name: str):
         for article in articles:
+            source = cls._unit_embedding(article)
             action = {
                 "_index": index_name,
-                "_source": article
+                "_source": source
             }
-            actions.append(action)
+            # Keying by URL makes re-indexing the same article an overwrite
+            if source.get("url"):
+                action["_id"] = source["url"]
+            yield action
+    
+    def _apply_bulk_settings(self, index_name: str):
+        self.es.indices.put_settings(
+            index=index_name,
+            settings={"index": {"refresh_interval": self.bulk_refresh_interval, "number_of_replicas": 0,
+                                "translog.durability": self.translog_durability}}
+        )
+    
+    def _apply_serving_settings(self, index_name: str):
+        # Served indices fsync the translog on every request again
+        self.es.indices.put_settings(
+            index=index_name,
+            settings={"index": {"refresh_interval": self.refresh_interval,
+                                "number_of_replicas": self.number_of_replicas,
+                                "translog.durability": "request"}}
+        )
+    
+    @contextmanager
+    def bulk_load_context(self, index_name: str):
+        """Relax refresh, replication and translog fsync while bulk loading, then apply the serving settings."""
+        self._apply_bulk_settings(index_name)
+        try:
+            yield
+        finally:
+            self._apply_serving_settings(index_name)
+    
+    def index_articles(self, articles: Iterable[Union[Article, Dict]], index_name: str, chunk_size: Optional[int] = None,
+                       thread_count: int = 4, queue_size: int = 4):
+        self.create_index(index_name)
+        
+        success, failed = 0, []
+        try:
+            # Chunks are sent from thread_count threads; actions are still generated lazily
+            with self.bulk_load_context(index_name):
+                for ok, info in helpers.parallel_bulk(
+                    self.es.options(request_timeout=120),
+                    self._bulk_actions(articles, index_name),
+                    thread_count=thread_count,
+                    queue_size=queue_size,
+                    chunk_size=chunk_size or self.bulk_chunk_size,
+                    max_chunk_bytes=self.bulk_max_chunk_bytes,
+                    raise_on_error=False
+                ):
+                    if ok:
+                        success += 1
+                    else:
+                        failed.append(info)
+            
+            print(f"Successfully indexed {success} articles")
+            if failed:
+                print(f"Failed to index {len(failed)} articles")
+            return success, failed
+        
+        except Exception as e:
+            print(f"Error during bulk indexing: {e}")
+            raise
+    
+    def fast_bulk_index(self, articles: Iterable[Union[Article, Dict]], index_name: str, chunk_size: Optional[int] = None):
+        """Index articles by building the NDJSON _bulk body directly with orjson, bypassing the bulk helpers."""
+        self.create_index(index_name)
+        chunk_size = chunk_size or self.bulk_chunk_size
+        client = self.es.options(request_timeout=120)
+        
+        success, failed = 0, []
+        body = bytearray()
+        count = 0
+        
+        try:
+            with self.bulk_load_context(index_name):
+                for article in articles:
+                    article = self._unit_embedding(article)
+                    header = {"_index": index_name}
+                    if article.get("url"):
+                        header["_id"] = article["url"]
+                    
+                    body += orjson.dumps({"index": header})
+                    body += b'\n'
+                    body += orjson.dumps(article)
+                    body += b'\n'
+                    count += 1
+                    
+                    if count >= chunk_size or len(body) >= self.bulk_max_chunk_bytes:
+                        ok, errors = self._send_bulk_body(client, body)
+                        success += ok
+                        failed.extend(errors)
+                        body.clear()
+                        count = 0
+                
+                if body:
+                    ok, errors = self._send_bulk_body(client, body)
+                    success += ok
+                    failed.extend(errors)
+            
+            print(f"Successfully indexed {success} articles")
+            if failed:
+                print(f"Failed to index {len(failed)} articles")
+            return success, failed
+        
+        except Exception as e:
+            print(f"Error during bulk indexing: {e}")
+            raise
+    
+    @staticmethod
+    def _send_bulk_body(client: Elasticsearch, body: bytearray) -> Tuple[int, List[Dict]]:
+        response = client.bulk(operations=bytes(body))
+        if not response["errors"]:
+            return len(response["items"]), []
+        
+        failed = [item for item in response["items"] if "error" in item["index"]]
+        return len(response["items"]) - len(failed), failed
+    
+    async def index_articles_async(self, articles: Iterable[Union[Article, Dict]], index_name: str, chunk_size: Optional[int] = None):
+        await asyncio.to_thread(self.create_index, index_name)
         
         try:
-            success, failed = helpers.bulk(self.es, actions, raise_on_error=False)
+            # Same bulk/serving settings switch as bulk_load_context, without blocking the loop
+            await asyncio.to_thread(self._apply_bulk_settings, index_name)
+            try:
+                success, failed = await helpers.async_bulk(
+                    self.aes.options(request_timeout=120),
+                    self._bulk_actions(articles, index_name),
+                    chunk_size=chunk_size or self.bulk_chunk_size,
+                    max_chunk_bytes=self.bulk_max_chunk_bytes,
+                    raise_on_error=False
+                )
+            finally:
+                await asyncio.to_thread(self._apply_serving_settings, index_name)
+            
             print(f"Successfully indexed {success} articles")
             if failed:
                 print(f"Failed to index {len(failed)} articles")
@@ -100,22 +311,50 @@ class ElasticsearchIndexer:
             print(f"Error searching articles: {e}")
             return []
     
-    def semantic_search(self, index_name: str, query_text: str, size: int = 10):
-        from sentence_transformers import SentenceTransformer
+    def _get_query_model(self):
+        # Loaded on first query and reused; the lock stops concurrent threads loading it twice
+        with self._query_model_lock:
+            if self._query_model is None:
+                from sentence_transformers import SentenceTransformer
+                self._query_model = SentenceTransformer('all-MiniLM-L6-v2')
+            return self._query_model
+    
+    def _encode_queries(self, texts: List[str]) -> List[List[float]]:
+        return cached_batch(
+            texts,
+            self.embedding_cache,
+            lambda batch: self._get_query_model().encode(batch, normalize_embeddings=True).tolist()
+        )
+    
+    def semantic_search(self, index_name: str, query_text: str, size: int = 10,
+                        num_candidates: Optional[int] = None, similarity: Optional[float] = None,
+                        filter: Optional[Dict] = None):
+        """
+        kNN search over article embeddings.
         
+        num_candidates trades latency for recall (default max(size * 10, 50)),
+        similarity drops candidates below that vector similarity, and filter is
+        an Elasticsearch query applied during the kNN search.
+        """
         try:
-            model = SentenceTransformer('all-MiniLM-L6-v2')
-            query_vector = model.encode(query_text).tolist()
+            query_vector = self._encode_queries([query_text])[0]
+            
+            knn = {
+                "field": "embedding",
+                "query_vector": query_vector,
+                "k": size,
+                "num_candidates": num_candidates or max(size * 10, 50)
+            }
+            if similarity is not None:
+                knn["similarity"] = similarity
+            if filter is not None:
+                knn["filter"] = filter
             
             response = self.es.search(
                 index=index_name,
                 body={
-                    "knn": {
-                        "field": "embedding",
-                        "query_vector": query_vector,
-                        "k": size,
-                        "num_candidates": 100
-                    },
+                    "knn": knn,
+                    "size": size,
                     "_source": ["title", "description", "url", "published_at", "source", "company"]
                 }
             )
@@ -126,32 +365,43 @@ class ElasticsearchIndexer:
             print(f"Error in semantic search: {e}")
             return []
     
-    def hybrid_search(self, index_name: str, query: str, size: int = 10, text_weight: float = 0.5):
-        from sentence_transformers import SentenceTransformer
-        
+    def _hybrid_query(self, query: str, query_vector: List[float], size: int, text_weight: float,
+                      min_score: Optional[float] = None, source_includes: Optional[List[str]] = None) -> Dict:
+        # BM25 query and HNSW kNN run side by side; ES sums their boosted scores,
+        # so no per-document vector scoring script is needed
+        body = {"size": size}
+        if text_weight > 0:
+            body["query"] = {
+                "multi_match": {
+                    "query": query,
+                    "fields": ["title", "description", "content", "full_text"],
+                    "boost": text_weight
+                }
+            }
+        if text_weight < 1:
+            body["knn"] = {
+                "field": "embedding",
+                "query_vector": query_vector,
+                "k": size,
+                "num_candidates": max(size * 10, 50),
+                "boost": 1 - text_weight
+            }
+        if min_score is not None:
+            # Let ES drop low-scoring hits before they are serialized
+            body["min_score"] = min_score
+        if source_includes is not None:
+            # Skip large fields such as the embedding vector in the response
+            body["_source"] = {"includes": list(source_includes)}
+        return body
+    
+    def hybrid_search(self, index_name: str, query: str, size: int = 10, text_weight: float = 0.5,
+                      min_score: Optional[float] = None, source_includes: Optional[List[str]] = None):
         try:
-            model = SentenceTransformer('all-MiniLM-L6-v2')
-            query_vector = model.encode(query).tolist()
+            query_vector = self._encode_queries([query])[0]
             
             response = self.es.search(
                 index=index_name,
-                body={
-                    "query": {
-                        "script_score": {
-                            "query": {
-                                "multi_match": {
-                                    "query": query,
-                                    "fields": ["title", "description", "content", "full_text"]
-                                }
-                            },
-                            "script": {
-                                "source": f"_score * {text_weight} + cosineSimilarity(params.query_vector, 'embedding') * {1 - text_weight}",
-                                "params": {"query_vector": query_vector}
-                            }
-                        }
-                    },
-                    "size": size
-                }
+                body=self._hybrid_query(query, query_vector, size, text_weight, min_score, source_includes)
             )
             
             print(f"[DEBUG] Hybrid search for '{query}': found {len(response['hits']['hits'])} results")
@@ -160,3 +410,35 @@ class ElasticsearchIndexer:
         except Exception as e:
             print(f"Error in hybrid search: {e}")
             return {"hits": {"hits": []}}
+    
+    async def hybrid_msearch_async(self, index_name: str,
+                                   queries: List[Tuple[str, int, float, Optional[float]]],
+                                   source_includes: Optional[List[str]] = None) -> List[Union[Dict, Exception]]:
+        """
+        Run several hybrid searches in one _msearch request; queries are (query, size, text_weight, min_score).
+        
+        A search that fails is returned as an exception in its slot rather than as empty hits.
+        """
+        texts = [query for query, _, _, _ in queries]
+        query_vectors = await asyncio.to_thread(self._encode_queries, texts)
+        
+        searches = []
+        for (query, size, text_weight, min_score), query_vector in zip(queries, query_vectors):
+            searches.append({"index": index_name})
+            searches.append(
+                self._hybrid_query(query, query_vector, size, text_weight, min_score, source_includes)
+            )
+        
+        response = await self.aes.msearch(searches=searches)
+        
+        results = []
+        for item in response["responses"]:
+            if "error" in item:
+                print(f"Error in hybrid search: {item['error']}")
+                results.append(RuntimeError(f"Hybrid search failed: {item['error']}"))
+            else:
+                results.append(item)
+        return results
+    
+    async def aclose(self):
+        await self.aes.close()
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+
+def content_digest(text: str) -> bytes:
+    """Raw 16-byte blake2b digest of a piece of text."""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def content_hash(text: str) -> str:
+    """Short, collision-safe key for a piece of text."""
+    return content_digest(text).hex()
+
+
+class LRUCache:
+    """Thread-safe bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class EmbeddingDiskCache:
+    """
+    SQLite store of embeddings and entities keyed by content digest, kept across runs.
+    
+    `model_key` identifies the models that produced the stored results; opening the
+    cache with a different key clears it so stale vectors and entities aren't served.
+    """
+    
+    def __init__(self, path: str, model_key: str = ""):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS emb (h BLOB PRIMARY KEY, v BLOB, ents BLOB)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT)")
+        
+        row = self._conn.execute("SELECT v FROM meta WHERE k = 'model_key'").fetchone()
+        if row is None or row[0] != model_key:
+            if row is not None:
+                print(f"Embedding cache at {path} was built with different models; clearing it")
+            self._conn.execute("DELETE FROM emb")
+            self._conn.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('model_key', ?)", (model_key,))
+        
+        self._conn.commit()
+        self._lock = threading.Lock()
+    
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, Tuple[List[float], List[Dict]]]:
+        """Return (embedding, entities) for every stored key."""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT h, v, ents FROM emb WHERE h IN ({placeholders})", chunk
+                ).fetchall()
+                for key, vector, entities in rows:
+                    found[bytes(key)] = (self._decode_vector(vector), orjson.loads(entities))
+        
+        return found
+    
+    def put_many(self, items: Iterable[Tuple[bytes, List[float], List[Dict]]]):
+        rows = [
+            (key, np.asarray(embedding, dtype=np.float16).tobytes(), orjson.dumps(entities))
+            for key, embedding, entities in items
+        ]
+        if not rows:
+            return
+        
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO emb (h, v, ents) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+    
+    @staticmethod
+    def _decode_vector(data: bytes) -> List[float]:
+        # Vectors are stored as float16 to halve I/O; renormalize so they stay
+        # within the unit-length tolerance of the dot_product index
+        vector = np.frombuffer(data, dtype=np.float16).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def cached_batch(texts: List[str], cache: LRUCache, compute: Callable[[List[str]], List]) -> List:
+    """
+    Look texts up in cache and run compute once over the distinct misses.
+    
+    compute returns None for a text it failed on; those results are passed
+    through but not cached, while empty results (e.g. no entities) are.
+    """
+    keys = [content_hash(text) for text in texts]
+    results = [cache.get(key) for key in keys]
+
+    missing = {}
+    for i, (key, result) in enumerate(zip(keys, results)):
+        if result is None:
+            missing.setdefault(key, []).append(i)
+
+    if missing:
+        miss_texts = [texts[indices[0]] for indices in missing.values()]
+        for (key, indices), value in zip(missing.items(), compute(miss_texts)):
+            if value is not None:
+                cache.put(key, value)
+            for i in indices:
+                results[i] = value
+
+    return results
@@ -1,6 +1,19 @@
 import os
-import json
-from typing import List, Dict
+from typing import Iterator, List
+
+import msgspec
+
+from src.article import Article
+
+
+# Typed codec: lines decode straight into Article structs, no intermediate dicts
+_encoder = msgspec.json.Encoder()
+_decoder = msgspec.json.Decoder(Article)
+
+
+# Bound the in-memory payload for very large batches
+WRITE_CHUNK_SIZE = 4 * 1024 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
 
 
 class JSONHandler:
@@ -21,13 +34,20 @@ class JSONHandler:
         return resolved
 
     @staticmethod
-    def save_to_json(articles: List[Dict], output_file: str):
+    def save_to_json(articles: List[Article], output_file: str):
         try:
             resolved_path = JSONHandler._resolve_path(output_file, for_write=True)
-            with open(resolved_path, 'a', encoding='utf-8') as f:
+            with open(resolved_path, 'ab', buffering=WRITE_BUFFER_SIZE) as f:
+                # Encode records into one buffer and write it in few large calls
+                payload = bytearray()
                 for article in articles:
-                    json.dump(article, f, ensure_ascii=False)
-                    f.write('\n')
+                    _encoder.encode_into(article, payload, -1)
+                    payload += b'\n'
+                    if len(payload) >= WRITE_CHUNK_SIZE:
+                        f.write(payload)
+                        payload.clear()
+                if payload:
+                    f.write(payload)
             
             print(f"Successfully appended {len(articles)} articles to {resolved_path}")
         
@@ -36,18 +56,32 @@ class JSONHandler:
             raise
     
     @staticmethod
-    def load_from_json(input_file: str) -> List[Dict]:
-        articles = []
-        try:
-            resolved_path = JSONHandler._resolve_path(input_file, for_write=False)
-            with open(resolved_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        articles.append(json.loads(line))
-            
-            print(f"Successfully loaded {len(articles)} articles from {resolved_path}")
-            return articles
+    def iter_from_json(input_file: str) -> Iterator[Article]:
+        """
+        Yield articles one JSONL line at a time, so memory use doesn't grow with the file.
         
-        except Exception as e:
+        A missing or unreadable file yields nothing; a malformed line raises ValueError
+        rather than silently ending the stream part-way through.
+        """
+        resolved_path = JSONHandler._resolve_path(input_file, for_write=False)
+        try:
+            f = open(resolved_path, 'rb')
+        except OSError as e:
             print(f"Error loading from JSON: {e}")
-            return []
+            return
+        
+        with f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield _decoder.decode(line)
+                except msgspec.DecodeError as e:
+                    raise ValueError(f"Invalid article on line {line_number} of {resolved_path}: {e}") from e
+    
+    @staticmethod
+    def load_from_json(input_file: str) -> List[Article]:
+        articles = list(JSONHandler.iter_from_json(input_file))
+        if articles:
+            print(f"Successfully loaded {len(articles)} articles from {JSONHandler._resolve_path(input_file)}")
+        return articles
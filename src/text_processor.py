@@ -1,71 +1,198 @@
 from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict
+from typing import List, Dict, Optional
+import msgspec
+import numpy as np
+import re
 import torch
 
+from src.article import Article
+from src.embedding_cache import EmbeddingDiskCache, LRUCache, cached_batch, content_digest
+
+# BERT-NER sees at most 512 tokens, so longer texts are split into chunks
+NER_CHUNK_TOKENS = 400
+# Texts shorter than this carry no useful entities and skip NER entirely
+NER_MIN_CHARS = 16
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
 
 class TextProcessor:
-    def __init__(self, ner_model: str = "dslim/bert-base-NER", embedding_model: str = "all-MiniLM-L6-v2"):
-        self.device = 0 if torch.cuda.is_available() else -1
+    def __init__(self, ner_model: str = "dslim/bert-base-NER", embedding_model: str = "all-MiniLM-L6-v2",
+                 cache_size: int = 10000, cache_path: Optional[str] = None):
+        use_cuda = torch.cuda.is_available()
+        self.device = 0 if use_cuda else -1
+        # Half precision halves weight/activation memory traffic on GPU; CPU stays FP32
+        dtype = torch.float16 if use_cuda else torch.float32
         
         self.ner_pipeline = pipeline(
             "ner",
-            model=ner_model,
-            tokenizer=ner_model,
+            model=AutoModelForTokenClassification.from_pretrained(ner_model, torch_dtype=dtype),
+            tokenizer=AutoTokenizer.from_pretrained(ner_model),
             aggregation_strategy="simple",
             device=self.device
         )
         
-        self.embedding_model = SentenceTransformer(embedding_model)
+        self.embedding_model = SentenceTransformer(embedding_model, device="cuda" if use_cuda else "cpu")
+        if use_cuda:
+            self.embedding_model.half()
+        
+        # Results keyed by content hash, so reposted or re-fetched articles skip inference
+        self.embedding_cache = LRUCache(maxsize=cache_size)
+        self.ner_cache = LRUCache(maxsize=cache_size)
+        # Optional on-disk store so results survive restarts
+        self.disk_cache = (
+            EmbeddingDiskCache(cache_path, model_key=f"{ner_model}|{embedding_model}") if cache_path else None
+        )
     
     def extract_entities(self, text: str) -> List[Dict]:
-        if not text:
+        if len(text) < NER_MIN_CHARS:
             return []
         
+        return self.extract_entities_batch([text])[0] or []
+    
+    def extract_entities_batch(self, texts: List[str], batch_size: int = 16) -> List[Optional[List[Dict]]]:
+        """Entities for each text; None where NER failed, so callers can tell it from no entities."""
+        return cached_batch(texts, self.ner_cache, lambda batch: self._run_ner(batch, batch_size))
+    
+    def _run_ner(self, texts: List[str], batch_size: int) -> List[Optional[List[Dict]]]:
+        # Flatten every text's chunks into one pipeline call, remembering the owner
+        chunks = []
+        owners = []
+        for i, text in enumerate(texts):
+            if len(text.strip()) < NER_MIN_CHARS:
+                continue
+            for chunk in self._ner_chunks(text):
+                chunks.append(chunk)
+                owners.append(i)
+        
+        grouped = [[] for _ in texts]
+        if not chunks:
+            return grouped
+        
         try:
-            entities = self.ner_pipeline(text)
-            
-            seen = set()
-            entity_details = []
-            
-            for entity in entities:
-                entity_type = entity['entity_group']
-                entity_word = entity['word']
-                
-                entity_key = (entity_word, entity_type)
-                if entity_key not in seen:
-                    seen.add(entity_key)
-                    entity_details.append({
-                        'text': entity_word,
-                        'type': entity_type
-                    })
-            
-            return entity_details
+            results = self.ner_pipeline(chunks, batch_size=batch_size)
         
         except Exception as e:
             print(f"Error extracting entities: {e}")
-            return []
+            return [None for _ in texts]
+        
+        for i, entities in zip(owners, results):
+            grouped[i].extend(entities)
+        
+        return [self._dedupe_entities(entities) for entities in grouped]
+    
+    def _ner_chunks(self, text: str) -> List[str]:
+        """Greedily pack sentences into chunks of at most NER_CHUNK_TOKENS tokens."""
+        tokenizer = self.ner_pipeline.tokenizer
+        sentences = [s for s in SENTENCE_SPLIT.split(text) if s]
+        encoded = tokenizer(sentences, add_special_tokens=False, return_offsets_mapping=True)
+        
+        chunks = []
+        current = []
+        current_tokens = 0
+        for sentence, offsets in zip(sentences, encoded['offset_mapping']):
+            # A single run-on sentence is cut at token boundaries
+            pieces = [
+                (sentence[offsets[start][0]:offsets[min(start + NER_CHUNK_TOKENS, len(offsets)) - 1][1]],
+                 min(NER_CHUNK_TOKENS, len(offsets) - start))
+                for start in range(0, len(offsets), NER_CHUNK_TOKENS)
+            ]
+            
+            for piece, n_tokens in pieces:
+                if current and current_tokens + n_tokens > NER_CHUNK_TOKENS:
+                    chunks.append(' '.join(current))
+                    current = []
+                    current_tokens = 0
+                current.append(piece)
+                current_tokens += n_tokens
+        
+        if current:
+            chunks.append(' '.join(current))
+        
+        return chunks
+    
+    def _dedupe_entities(self, entities: List[Dict]) -> List[Dict]:
+        unique = {}
+        
+        for entity in entities:
+            # Drop leftover WordPiece markers so the indexed text is clean
+            entity_word = entity['word'].replace('##', '').strip()
+            if not entity_word:
+                continue
+            
+            key = (entity_word, entity['entity_group'])
+            if key not in unique:
+                unique[key] = {'text': key[0], 'type': key[1]}
+        
+        return list(unique.values())
     
     def generate_embedding(self, text: str) -> List[float]:
         if not text:
             return []
         
+        return self.generate_embeddings([text])[0] or []
+    
+    def generate_embeddings(self, texts: List[str], batch_size: int = 64) -> List[Optional[List[float]]]:
+        """Embeddings for each text; None where encoding failed."""
+        return cached_batch(texts, self.embedding_cache, lambda batch: self._encode(batch, batch_size))
+    
+    def _encode(self, texts: List[str], batch_size: int) -> List[Optional[List[float]]]:
         try:
-            embedding = self.embedding_model.encode(text, convert_to_tensor=False)
-            return embedding.tolist()
+            embeddings = self.embedding_model.encode(
+                texts,
+                batch_size=batch_size,
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+            # Normalize in FP32 so FP16 model output still meets dot_product's unit-length tolerance
+            embeddings = embeddings.astype(np.float32)
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            np.divide(embeddings, norms, out=embeddings, where=norms > 0)
+            return embeddings.tolist()
         except Exception as e:
             print(f"Error generating embedding: {e}")
-            return []
+            return [None for _ in texts]
+    
+    @staticmethod
+    def _full_text(article: Article) -> str:
+        return f"{article.title or ''} {article.description or ''} {article.content or ''}"
     
-    def process_article(self, article: Dict) -> Dict:
-        full_text = f"{article.get('title', '')} {article.get('description', '')} {article.get('content', '')}"
+    def process_article(self, article: Article) -> Article:
+        return self.process_articles([article])[0]
+    
+    def process_articles(self, articles: List[Article], batch_size: int = 16, embedding_batch_size: int = 64) -> List[Article]:
+        """Process articles with batched NER and embedding inference."""
+        texts = [self._full_text(article) for article in articles]
+        entities = [None] * len(texts)
+        embeddings = [None] * len(texts)
+        
+        # Serve previously processed texts from disk and run inference only on the rest
+        keys = [content_digest(text) for text in texts] if self.disk_cache else []
+        stored = self.disk_cache.get_many(keys) if self.disk_cache else {}
+        for i, key in enumerate(keys):
+            if key in stored:
+                embeddings[i], entities[i] = stored[key]
+        pending = [i for i in range(len(texts)) if embeddings[i] is None]
+        
+        # Batch similar-length texts together to minimize padding, then restore order
+        order = sorted(pending, key=lambda i: len(texts[i]))
+        sorted_texts = [texts[i] for i in order]
+        
+        sorted_entities = self.extract_entities_batch(sorted_texts, batch_size=batch_size)
+        sorted_embeddings = self.generate_embeddings(sorted_texts, batch_size=embedding_batch_size)
         
-        entities = self.extract_entities(full_text)
-        embedding = self.generate_embedding(full_text)
+        for position, i in enumerate(order):
+            entities[i] = sorted_entities[position]
+            embeddings[i] = sorted_embeddings[position]
         
-        processed_article = article.copy()
-        processed_article['entities'] = entities
-        processed_article['embedding'] = embedding
-        processed_article['full_text'] = full_text
+        if self.disk_cache:
+            # Skip failed embeddings or NER so they are retried next run
+            self.disk_cache.put_many(
+                (keys[i], embeddings[i], entities[i]) for i in order if embeddings[i] is not None and entities[i] is not None
+            )
         
-        return processed_article
+        return [
+            msgspec.structs.replace(article, entities=article_entities or [], embedding=embedding or [],
+                                     full_text=full_text)
+            for article, full_text, article_entities, embedding in zip(articles, texts, entities, embeddings)
+        ]